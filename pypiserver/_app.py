@@ -2,13 +2,24 @@ import logging
 import mimetypes
 import os
 import re
-import xml.dom.minidom
+import shutil
+import tempfile
+import threading
+import typing as t
+import uuid
 import xmlrpc.client as xmlrpclib
 import zipfile
-from collections import namedtuple
-from io import BytesIO
+from collections import OrderedDict, namedtuple
 from urllib.parse import urljoin, urlparse
-from json import dumps
+from xml.etree import ElementTree
+
+import pkg_resources
+
+try:
+    # Faster, and returns the bytes to send directly
+    from orjson import dumps
+except ImportError:
+    from json import dumps
 
 from pypiserver.config import RunConfig
 from . import __version__
@@ -19,7 +30,9 @@ from .bottle import (
     request,
     response,
     HTTPError,
+    HTTPResponse,
     Bottle,
+    SimpleTemplate,
     template,
 )
 from .pkg_helpers import guess_pkgname_and_version, normalize_pkgname_for_url
@@ -28,16 +41,26 @@ log = logging.getLogger(__name__)
 config: RunConfig
 app = Bottle()
 
+_LOGO_SVG = pkg_resources.resource_string(__name__, "static/logo.svg")
 
-class auth:
-    """decorator to apply authentication if specified for the decorated method & action"""
+# Sorted listings of the current catalog version, least recently used first.
+# Keys include the project names clients ask for, hence the bound.
+_LISTING_CACHE_SIZE = 1024
+_listing_cache: "OrderedDict[tuple, t.Any]" = OrderedDict()
+_listing_cache_version: t.Optional[int] = None
+_listing_cache_lock = threading.Lock()
+
+# Catalog versions are only comparable within one process (e.g. not across
+# several gunicorn workers), so ETags are made unique to this process.
+_ETAG_PREFIX = uuid.uuid4().hex[:12]
 
-    def __init__(self, action):
-        self.action = action
 
-    def __call__(self, method):
+def auth(action):
+    """decorator to apply authentication if specified for the decorated method & action"""
+
+    def decorator(method):
         def protector(*args, **kwargs):
-            if self.action in config.authenticate:
+            if action in config.authenticate:
                 if not request.auth or request.auth[1] is None:
                     raise HTTPError(
                         401, headers={"WWW-Authenticate": 'Basic realm="pypi"'}
@@ -48,6 +71,17 @@ class auth:
 
         return protector
 
+    return decorator
+
+
+def _all_packages():
+    """Return all backend packages, listing them at most once per request."""
+    packages = request.environ.get("pypiserver.packages")
+    if packages is None:
+        packages = list(config.backend.get_all_packages())
+        request.environ["pypiserver.packages"] = packages
+    return packages
+
 
 @app.hook("before_request")
 def log_request():
@@ -61,10 +95,16 @@ def print_request():
     request.custom_fullpath = (
         parsed.path.rstrip("/") + "/" + request.fullpath.lstrip("/")
     )
+    # Where the app is served from, e.g. when mounted or behind a proxy
+    request.custom_script_root = (
+        parsed.path.rstrip("/") + "/" + request.script_name.lstrip("/")
+    )
 
 
 @app.hook("after_request")
 def log_response():
+    if not log.isEnabledFor(logging.INFO):
+        return
     log.info(
         config.log_res_frmt,
         {  # vars(response))  ## DOES NOT WORK!
@@ -79,7 +119,15 @@ def log_response():
 
 @app.error
 def log_error(http_error):
-    log.info(config.log_err_frmt, vars(http_error))
+    if log.isEnabledFor(logging.INFO):
+        log.info(config.log_err_frmt, vars(http_error))
+
+
+@app.route("/static/logo.svg")
+def logo():
+    response.content_type = "image/svg+xml"
+    response.set_header("Cache-Control", "public, max-age=31536000, immutable")
+    return _LOGO_SVG
 
 
 @app.route("/favicon.ico")
@@ -103,12 +151,12 @@ def root():
     )
 
 
-_bottle_upload_filename_re = re.compile(r"^[a-z0-9_.!+-]+$", re.I)
+_bottle_upload_filename_re = re.compile(r"[A-Za-z0-9_.!+-]+")
 
 
 def is_valid_pkg_filename(fname):
     """See https://github.com/pypiserver/pypiserver/issues/102"""
-    return _bottle_upload_filename_re.match(fname) is not None
+    return _bottle_upload_filename_re.fullmatch(fname) is not None
 
 
 def doc_upload():
@@ -116,9 +164,14 @@ def doc_upload():
         content = request.files["content"]
     except KeyError:
         raise HTTPError(400, "Missing 'content' file-field!")
-    zip_data = content.file.read()
+    fh = content.file
+    if not fh.seekable():
+        # ZipFile needs to seek to the central directory at the end
+        spooled = tempfile.SpooledTemporaryFile(max_size=2**20)
+        shutil.copyfileobj(fh, spooled)
+        fh = spooled
     try:
-        zf = zipfile.ZipFile(BytesIO(zip_data))
+        zf = zipfile.ZipFile(fh)
         zf.getinfo("index.html")
     except Exception:
         raise HTTPError(400, "not a zip file")
@@ -214,90 +267,227 @@ def pep_503_redirects(project=None):
     return redirect(request.custom_fullpath + "/", 301)
 
 
+def _parse_rpc_request(body):
+    """Return the `methodName` and the first `string` param of an RPC2 body.
+
+    Streams through the XML and stops as soon as both are found, instead of
+    building the whole DOM tree.
+    """
+    methodname = value = None
+    for _, elem in ElementTree.iterparse(body, events=("end",)):
+        if elem.tag == "methodName" and methodname is None:
+            methodname = (elem.text or "").strip()
+        elif elem.tag == "string" and value is None:
+            value = (elem.text or "").strip()
+        elem.clear()
+        if methodname is not None and value is not None:
+            break
+    if methodname is None:
+        raise HTTPError(400, "Missing 'methodName' in RPC2 request!")
+    return methodname, value
+
+
+def _build_search_index():
+    """Return all packages, and a map of each 2-character substring of their
+    names to the positions of the packages containing it.
+    """
+    packages = _all_packages()
+    index: t.Dict[str, t.Set[int]] = {}
+    for pos, p in enumerate(packages):
+        name = p.pkgname
+        for i in range(len(name) - 1):
+            index.setdefault(name[i : i + 2], set()).add(pos)
+    return packages, index
+
+
+def _search_packages(value):
+    """Return `(ordering, package)` for all packages whose name contains
+    `value`, ordered as the backend lists them.
+    """
+    if len(value) < 2 or config.backend.catalog_version() is None:
+        # Nothing to look up, or the index would be rebuilt for every search
+        return [
+            (pos, p)
+            for pos, p in enumerate(_all_packages())
+            if value in p.pkgname
+        ]
+
+    packages, index = _cached_listing(("search",), _build_search_index)
+    postings = []
+    for i in range(len(value) - 1):
+        posting = index.get(value[i : i + 2])
+        if posting is None:
+            return []
+        postings.append(posting)
+    postings.sort(key=len)
+    candidates = postings[0].intersection(*postings[1:])
+    return [
+        (pos, packages[pos])
+        for pos in sorted(candidates)
+        if value in packages[pos].pkgname
+    ]
+
+
+_SEARCH_HIT_XML = (
+    "<value><struct>\n"
+    "<member>\n<name>_pypi_ordering</name>\n<value><int>{}</int></value>\n"
+    "</member>\n"
+    "<member>\n<name>version</name>\n<value><string>{}</string></value>\n"
+    "</member>\n"
+    "<member>\n<name>name</name>\n<value><string>{}</string></value>\n"
+    "</member>\n"
+    "<member>\n<name>summary</name>\n<value><string>{}</string></value>\n"
+    "</member>\n"
+    "</struct></value>\n"
+)
+
+
+def _dump_search_hits(hits):
+    """Yield the XML for `hits`, as `xmlrpclib.dumps()` would serialize them
+    as a list of dicts, one hit at a time.
+    """
+    yield (
+        "<?xml version='1.0'?>\n<methodCall>\n"
+        "<methodName>search</methodName>\n"
+        "<params>\n<param>\n<value><array><data>\n"
+    )
+    escape = xmlrpclib.escape
+    for ordering, p in hits:
+        version = escape(p.version)
+        # We do not presently have any description/summary, returning
+        # version instead
+        yield _SEARCH_HIT_XML.format(
+            ordering, version, escape(p.pkgname), version
+        )
+    yield "</data></array></value>\n</param>\n</params>\n</methodCall>\n"
+
+
 @app.post("/RPC2")
 @auth("list")
 def handle_rpc():
     """Handle pip-style RPC2 search requests"""
-    parser = xml.dom.minidom.parse(request.body)
-    methodname = (
-        parser.getElementsByTagName("methodName")[0]
-        .childNodes[0]
-        .wholeText.strip()
-    )
+    methodname, value = _parse_rpc_request(request.body)
     log.debug(f"Processing RPC2 request for '{methodname}'")
     if methodname == "search":
-        value = (
-            parser.getElementsByTagName("string")[0]
-            .childNodes[0]
-            .wholeText.strip()
-        )
-        response = []
-        ordering = 0
-        for p in config.backend.get_all_packages():
-            if p.pkgname.count(value) > 0:
-                # We do not presently have any description/summary, returning
-                # version instead
-                d = {
-                    "_pypi_ordering": ordering,
-                    "version": p.version,
-                    "name": p.pkgname,
-                    "summary": p.version,
-                }
-                response.append(d)
-            ordering += 1
-        call_string = xmlrpclib.dumps(
-            (response,), "search", methodresponse=True
-        )
-        return call_string
+        if value is None:
+            raise HTTPError(400, "Missing 'string' param in RPC2 search!")
+        return _dump_search_hits(_search_packages(value))
+
+
+_HTML_HEADER = """\
+<!DOCTYPE html>
+<html>
+    <head>
+        <title>{{title}}</title>
+        <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/css/bootstrap.min.css" rel="stylesheet"
+      integrity="sha384-1BmE4kWBq78iYhFldvKuhfTAU6auU8tT94WrHftjDbrCEXSU1oBoqyl2QvZ6jIW3" crossorigin="anonymous">
+    </head>
+    <body>
+        <div class="container my-3">
+        <div class="col-lg-8 mx-auto">
+        <header class="d-flex align-items-center pb-3 mb-4 border-bottom">
+        <a href="/" class="d-flex align-items-center text-dark text-decoration-none">
+            <img src="{{static_root}}logo.svg" width="250" height="50" alt="Profusion PyPI Server">
+            <span class="fs-4">Python Package Index</span>
+        </a>
+        </header>
+        <div class="btn-group" role="group" aria-label="navigation">
+          <a type="button" class="btn btn-sm btn-outline-primary" href="/">Home</a>
+          <a type="button" class="btn btn-sm btn-outline-primary" href="/packages">Packages</a>
+          <a type="button" class="btn btn-sm btn-outline-primary" href="/simple">Simple Index</a>
+        </div>
+        <h3 class="mt-3">{{title}}</h3>
+"""
+
+_HTML_FOOTER = """\
+        </div>
+        </div>
+    </body>
+</html>
+"""
+
+_SIMPLE_INDEX_TMPL = SimpleTemplate(
+    _HTML_HEADER
+    + """\
+        % for p in links:
+             <a href="{{p}}/">{{p}}</a><br>
+        % end
+"""
+    + _HTML_FOOTER
+)
+
+_LINKS_TMPL = SimpleTemplate(
+    _HTML_HEADER
+    + """\
+        % for file, href in links:
+             <a href="{{href}}">{{file}}</a><br>
+        % end
+"""
+    + _HTML_FOOTER
+)
+
+
+def _cached_listing(key, compute):
+    """Return `compute()`, reusing its result for the same `key` until the
+    backend reports a new catalog version.
+
+    Empty results, e.g. for projects that do not exist, are not cached.
+    """
+    global _listing_cache_version
+
+    version = config.backend.catalog_version()
+    if version is None:
+        return compute()
+    with _listing_cache_lock:
+        if version != _listing_cache_version:
+            _listing_cache.clear()
+            _listing_cache_version = version
+        try:
+            _listing_cache.move_to_end(key)
+            return _listing_cache[key]
+        except KeyError:
+            pass
+
+    value = compute()
+    if not value:
+        return value
+    with _listing_cache_lock:
+        # only store the value if the catalog did not change meanwhile
+        if version == _listing_cache_version:
+            _listing_cache[key] = value
+            if len(_listing_cache) > _LISTING_CACHE_SIZE:
+                _listing_cache.popitem(last=False)
+    return value
+
+
+def _check_etag():
+    """Set an ETag for the current index page from the backend's catalog
+    version, and answer with a 304 if the client already has that version.
+    """
+    version = config.backend.catalog_version()
+    if version is None:
+        return
+    etag = f'W/"{_ETAG_PREFIX}-{version}"'
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match:
+        tags = {tag.strip() for tag in if_none_match.split(",")}
+        if "*" in tags or etag in tags or etag[2:] in tags:
+            raise HTTPResponse(status=304, ETag=etag)
+    response.set_header("ETag", etag)
 
 
 @app.route("/simple/")
 @auth("list")
 def simpleindex():
-    links = sorted(config.backend.get_projects())
-    tmpl = """\
-    <!DOCTYPE html>
-    <html>
-        <head>
-            <title>Simple Index</title>
-            <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/css/bootstrap.min.css" rel="stylesheet"
-          integrity="sha384-1BmE4kWBq78iYhFldvKuhfTAU6auU8tT94WrHftjDbrCEXSU1oBoqyl2QvZ6jIW3" crossorigin="anonymous">
-        </head>
-        <body>
-            <div class="container my-3">
-            <div class="col-lg-8 mx-auto">
-            <header class="d-flex align-items-center pb-3 mb-4 border-bottom">
-            <a href="/" class="d-flex align-items-center text-dark text-decoration-none">
-                <svg id="Layer_1" data-name="Layer 1" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 1036.67 250.33" width="250" height="50">
-                <title>Profusion PyPI Server</title>
-                <path class="cls-1" d="M40.3,303V102.41H78.75l.28,16c8-13.55,21.3-19.63,35.4-19.63,34.3,0,58.92,27.66,58.92,73.3,0,40.38-20.19,70-55.32,70-16.32,0-29.88-5.81-38.45-20.19v81Zm92.39-133.32c0-24.62-10.79-38.17-27.11-38.17-15.77,0-27.38,13.27-27.38,37.06,0,27.38,10,39.56,27.38,39.56C123.28,208.08,132.69,196.18,132.69,169.63Z" transform="translate(-40.3 -52.62)"></path>
-                <path class="cls-1" d="M180.26,238.51V102.41h37.62v12.45c11.89-15.21,24.34-16,38.17-16h3.87v40.94a59.74,59.74,0,0,0-10-.83c-19.92,0-29.6,8-29.6,28.49v71.09Z" transform="translate(-40.3 -52.62)"></path>
-                <path class="cls-1" d="M262.67,170.46c0-43.15,27.11-71.64,70.81-71.64,43.15,0,70,28.21,70,71.64,0,43.15-27.1,71.64-70,71.64C289,242.1,262.67,212.78,262.67,170.46Zm100.41,0c0-26-9.68-37.62-29.6-37.62s-29.6,11.62-29.6,37.62,9.69,38.17,29.6,38.17S363.08,196.46,363.08,170.46Z" transform="translate(-40.3 -52.62)"></path>
-                <path class="cls-1" d="M420.88,238.51V130.63H400.41V102.41h20.47c0-33.19,19.08-49.79,58.36-49.79V85c-16.32,0-19.08,3.59-19.08,17.42h19.91v28.22H460.16V238.51Z" transform="translate(-40.3 -52.62)"></path>
-                <path class="cls-1" d="M575.49,238.51v-16.6c-8.57,13.83-21.29,20.19-39.55,20.19-27.39,0-46.47-19.09-46.47-45.64V102.41h40.11v85.2c0,15.21,7.19,22.13,20.74,22.13,17.43,0,23.24-11.62,23.24-33.48V102.41h39.83v136.1Z" transform="translate(-40.3 -52.62)"></path>
-                <path class="cls-1" d="M705.5,143.63c-1.11-11.07-6.91-17.7-21.58-17.7-13.83,0-20.19,4.7-20.19,11.89,0,5.81,6.92,10,19.09,13C726.24,161.33,747,166.59,747,198.39c0,25.73-17.43,43.71-61.13,43.71-40.11,0-64.72-18.54-65.28-47.3h40.94c0,10.79,9.68,18.53,24.62,18.53,13,0,21.85-3.59,21.85-12.44,0-6.92-5-10-18-13-53.11-11.89-64.45-26-64.45-50.06,0-20.47,15.21-39,59.47-39,39.83,0,56.43,16.87,58.09,44.81Z" transform="translate(-40.3 -52.62)"></path>
-                <path class="cls-1" d="M756.65,86.09V52.62h40.11V86.09Zm0,152.42V102.41h40.11v136.1Z" transform="translate(-40.3 -52.62)"></path>
-                <path class="cls-1" d="M804.23,170.46c0-43.15,27.12-71.64,70.82-71.64,43.15,0,70,28.21,70,71.64,0,43.15-27.11,71.64-70,71.64C830.51,242.1,804.23,212.78,804.23,170.46Zm100.41,0c0-26-9.68-37.62-29.59-37.62s-29.6,11.62-29.6,37.62,9.68,38.17,29.6,38.17S904.64,196.46,904.64,170.46Z" transform="translate(-40.3 -52.62)"></path>
-                <path class="cls-1" d="M1036.58,238.51V154.14c0-17.15-6.36-22.68-20.74-22.68-15.77,0-23.79,8-23.79,24.89v82.16H951.94V102.41h38.17v17.15c7.75-13.83,21-20.74,40.94-20.74,26.56,0,45.92,16.87,45.92,43.42v96.27Z" transform="translate(-40.3 -52.62)"></path>
-                </svg>
-                <span class="fs-4">Python Package Index</span>
-            </a>
-            </header>
-            <div class="btn-group" role="group" aria-label="navigation">
-              <a type="button" class="btn btn-sm btn-outline-primary" href="/">Home</a>
-              <a type="button" class="btn btn-sm btn-outline-primary" href="/packages">Packages</a>
-              <a type="button" class="btn btn-sm btn-outline-primary" href="/simple">Simple Index</a>
-            </div>
-            <h3 class="mt-3">Simple Index</h3>
-            % for p in links:
-                 <a href="{{p}}/">{{p}}</a><br>
-            % end
-        </div>   
-        </div> 
-        </body>
-    </html>
-    """
-    return template(tmpl, links=links)
+    _check_etag()
+    links = _cached_listing(
+        ("simpleindex",), lambda: sorted(config.backend.get_projects())
+    )
+    return _SIMPLE_INDEX_TMPL.render(
+        title="Simple Index",
+        static_root=request.custom_script_root + "static/",
+        links=links,
+    )
 
 
 @app.route("/simple/:project/")
@@ -308,147 +498,79 @@ def simple(project):
     if project != normalized:
         return redirect(f"/simple/{normalized}/", 301)
 
-    packages = sorted(
-        config.backend.find_project_packages(project),
-        key=lambda x: (x.parsed_version, x.relfn),
+    packages = _cached_listing(
+        ("simple", project),
+        lambda: sorted(
+            config.backend.find_project_packages(project),
+            key=lambda x: (x.parsed_version, x.relfn),
+        ),
     )
     if not packages:
         if not config.disable_fallback:
             return redirect(f"{config.fallback_url.rstrip('/')}/{project}/")
         return HTTPError(404, f"Not Found ({normalized} does not exist)\n\n")
 
-    current_uri = request.custom_fullpath
-
+    _check_etag()
+    pkg_prefix = urljoin(request.custom_fullpath, "../../packages/")
     links = (
-        (
-            os.path.basename(pkg.relfn),
-            urljoin(current_uri, f"../../packages/{pkg.fname_and_hash}"),
-        )
+        (os.path.basename(pkg.relfn), pkg_prefix + pkg.fname_and_hash)
         for pkg in packages
     )
 
-    tmpl = """\
-    <!DOCTYPE html>
-    <html>
-        <head>
-            <title>Links for {{project}}</title>
-            <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/css/bootstrap.min.css" rel="stylesheet"
-          integrity="sha384-1BmE4kWBq78iYhFldvKuhfTAU6auU8tT94WrHftjDbrCEXSU1oBoqyl2QvZ6jIW3" crossorigin="anonymous">
-        </head>
-        <body>
-            <div class="container my-3">
-            <div class="col-lg-8 mx-auto">
-            <header class="d-flex align-items-center pb-3 mb-4 border-bottom">
-            <a href="/" class="d-flex align-items-center text-dark text-decoration-none">
-                <svg id="Layer_1" data-name="Layer 1" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 1036.67 250.33" width="250" height="50">
-                <title>Profusion PyPI Server</title>
-                <path class="cls-1" d="M40.3,303V102.41H78.75l.28,16c8-13.55,21.3-19.63,35.4-19.63,34.3,0,58.92,27.66,58.92,73.3,0,40.38-20.19,70-55.32,70-16.32,0-29.88-5.81-38.45-20.19v81Zm92.39-133.32c0-24.62-10.79-38.17-27.11-38.17-15.77,0-27.38,13.27-27.38,37.06,0,27.38,10,39.56,27.38,39.56C123.28,208.08,132.69,196.18,132.69,169.63Z" transform="translate(-40.3 -52.62)"></path>
-                <path class="cls-1" d="M180.26,238.51V102.41h37.62v12.45c11.89-15.21,24.34-16,38.17-16h3.87v40.94a59.74,59.74,0,0,0-10-.83c-19.92,0-29.6,8-29.6,28.49v71.09Z" transform="translate(-40.3 -52.62)"></path>
-                <path class="cls-1" d="M262.67,170.46c0-43.15,27.11-71.64,70.81-71.64,43.15,0,70,28.21,70,71.64,0,43.15-27.1,71.64-70,71.64C289,242.1,262.67,212.78,262.67,170.46Zm100.41,0c0-26-9.68-37.62-29.6-37.62s-29.6,11.62-29.6,37.62,9.69,38.17,29.6,38.17S363.08,196.46,363.08,170.46Z" transform="translate(-40.3 -52.62)"></path>
-                <path class="cls-1" d="M420.88,238.51V130.63H400.41V102.41h20.47c0-33.19,19.08-49.79,58.36-49.79V85c-16.32,0-19.08,3.59-19.08,17.42h19.91v28.22H460.16V238.51Z" transform="translate(-40.3 -52.62)"></path>
-                <path class="cls-1" d="M575.49,238.51v-16.6c-8.57,13.83-21.29,20.19-39.55,20.19-27.39,0-46.47-19.09-46.47-45.64V102.41h40.11v85.2c0,15.21,7.19,22.13,20.74,22.13,17.43,0,23.24-11.62,23.24-33.48V102.41h39.83v136.1Z" transform="translate(-40.3 -52.62)"></path>
-                <path class="cls-1" d="M705.5,143.63c-1.11-11.07-6.91-17.7-21.58-17.7-13.83,0-20.19,4.7-20.19,11.89,0,5.81,6.92,10,19.09,13C726.24,161.33,747,166.59,747,198.39c0,25.73-17.43,43.71-61.13,43.71-40.11,0-64.72-18.54-65.28-47.3h40.94c0,10.79,9.68,18.53,24.62,18.53,13,0,21.85-3.59,21.85-12.44,0-6.92-5-10-18-13-53.11-11.89-64.45-26-64.45-50.06,0-20.47,15.21-39,59.47-39,39.83,0,56.43,16.87,58.09,44.81Z" transform="translate(-40.3 -52.62)"></path>
-                <path class="cls-1" d="M756.65,86.09V52.62h40.11V86.09Zm0,152.42V102.41h40.11v136.1Z" transform="translate(-40.3 -52.62)"></path>
-                <path class="cls-1" d="M804.23,170.46c0-43.15,27.12-71.64,70.82-71.64,43.15,0,70,28.21,70,71.64,0,43.15-27.11,71.64-70,71.64C830.51,242.1,804.23,212.78,804.23,170.46Zm100.41,0c0-26-9.68-37.62-29.59-37.62s-29.6,11.62-29.6,37.62,9.68,38.17,29.6,38.17S904.64,196.46,904.64,170.46Z" transform="translate(-40.3 -52.62)"></path>
-                <path class="cls-1" d="M1036.58,238.51V154.14c0-17.15-6.36-22.68-20.74-22.68-15.77,0-23.79,8-23.79,24.89v82.16H951.94V102.41h38.17v17.15c7.75-13.83,21-20.74,40.94-20.74,26.56,0,45.92,16.87,45.92,43.42v96.27Z" transform="translate(-40.3 -52.62)"></path>
-                </svg>
-                <span class="fs-4">Python Package Index</span>
-            </a>
-            </header>
-            <div class="btn-group" role="group" aria-label="navigation">
-              <a type="button" class="btn btn-sm btn-outline-primary" href="/">Home</a>
-              <a type="button" class="btn btn-sm btn-outline-primary" href="/packages">Packages</a>
-              <a type="button" class="btn btn-sm btn-outline-primary" href="/simple">Simple Index</a>
-            </div>
-            <h3 class="mt-3">Links for {{project}}</h3>
-            % for file, href in links:
-                 <a href="{{href}}">{{file}}</a><br>
-            % end
-            </div>
-            </div>    
-        </body>
-    </html>
-    """
-    return template(tmpl, project=project, links=links)
+    return _LINKS_TMPL.render(
+        title=f"Links for {project}",
+        static_root=request.custom_script_root + "static/",
+        links=links,
+    )
 
 
 @app.route("/packages/")
 @auth("list")
 def list_packages():
+    _check_etag()
     fp = request.custom_fullpath
-    packages = sorted(
-        config.backend.get_all_packages(),
-        key=lambda x: (os.path.dirname(x.relfn), x.pkgname, x.parsed_version),
+    packages = _cached_listing(
+        ("list_packages",),
+        lambda: sorted(
+            _all_packages(),
+            key=lambda x: (
+                os.path.dirname(x.relfn),
+                x.pkgname,
+                x.parsed_version,
+            ),
+        ),
     )
 
-    links = (
-        (pkg.relfn_unix, urljoin(fp, pkg.fname_and_hash)) for pkg in packages
-    )
+    prefix = fp if fp.endswith("/") else fp + "/"
+    links = ((pkg.relfn_unix, prefix + pkg.fname_and_hash) for pkg in packages)
 
-    tmpl = """\
-    <!DOCTYPE html>
-    <html>
-        <head>
-            <title>Index of packages</title>
-            <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/css/bootstrap.min.css" rel="stylesheet"
-          integrity="sha384-1BmE4kWBq78iYhFldvKuhfTAU6auU8tT94WrHftjDbrCEXSU1oBoqyl2QvZ6jIW3" crossorigin="anonymous">
-        </head>
-        <body>
-            <div class="container my-3">
-            <div class="col-lg-8 mx-auto">
-            <header class="d-flex align-items-center pb-3 mb-4 border-bottom">
-            <a href="/" class="d-flex align-items-center text-dark text-decoration-none">
-                <svg id="Layer_1" data-name="Layer 1" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 1036.67 250.33" width="250" height="50">
-                <title>Profusion PyPI Server</title>
-                <path class="cls-1" d="M40.3,303V102.41H78.75l.28,16c8-13.55,21.3-19.63,35.4-19.63,34.3,0,58.92,27.66,58.92,73.3,0,40.38-20.19,70-55.32,70-16.32,0-29.88-5.81-38.45-20.19v81Zm92.39-133.32c0-24.62-10.79-38.17-27.11-38.17-15.77,0-27.38,13.27-27.38,37.06,0,27.38,10,39.56,27.38,39.56C123.28,208.08,132.69,196.18,132.69,169.63Z" transform="translate(-40.3 -52.62)"></path>
-                <path class="cls-1" d="M180.26,238.51V102.41h37.62v12.45c11.89-15.21,24.34-16,38.17-16h3.87v40.94a59.74,59.74,0,0,0-10-.83c-19.92,0-29.6,8-29.6,28.49v71.09Z" transform="translate(-40.3 -52.62)"></path>
-                <path class="cls-1" d="M262.67,170.46c0-43.15,27.11-71.64,70.81-71.64,43.15,0,70,28.21,70,71.64,0,43.15-27.1,71.64-70,71.64C289,242.1,262.67,212.78,262.67,170.46Zm100.41,0c0-26-9.68-37.62-29.6-37.62s-29.6,11.62-29.6,37.62,9.69,38.17,29.6,38.17S363.08,196.46,363.08,170.46Z" transform="translate(-40.3 -52.62)"></path>
-                <path class="cls-1" d="M420.88,238.51V130.63H400.41V102.41h20.47c0-33.19,19.08-49.79,58.36-49.79V85c-16.32,0-19.08,3.59-19.08,17.42h19.91v28.22H460.16V238.51Z" transform="translate(-40.3 -52.62)"></path>
-                <path class="cls-1" d="M575.49,238.51v-16.6c-8.57,13.83-21.29,20.19-39.55,20.19-27.39,0-46.47-19.09-46.47-45.64V102.41h40.11v85.2c0,15.21,7.19,22.13,20.74,22.13,17.43,0,23.24-11.62,23.24-33.48V102.41h39.83v136.1Z" transform="translate(-40.3 -52.62)"></path>
-                <path class="cls-1" d="M705.5,143.63c-1.11-11.07-6.91-17.7-21.58-17.7-13.83,0-20.19,4.7-20.19,11.89,0,5.81,6.92,10,19.09,13C726.24,161.33,747,166.59,747,198.39c0,25.73-17.43,43.71-61.13,43.71-40.11,0-64.72-18.54-65.28-47.3h40.94c0,10.79,9.68,18.53,24.62,18.53,13,0,21.85-3.59,21.85-12.44,0-6.92-5-10-18-13-53.11-11.89-64.45-26-64.45-50.06,0-20.47,15.21-39,59.47-39,39.83,0,56.43,16.87,58.09,44.81Z" transform="translate(-40.3 -52.62)"></path>
-                <path class="cls-1" d="M756.65,86.09V52.62h40.11V86.09Zm0,152.42V102.41h40.11v136.1Z" transform="translate(-40.3 -52.62)"></path>
-                <path class="cls-1" d="M804.23,170.46c0-43.15,27.12-71.64,70.82-71.64,43.15,0,70,28.21,70,71.64,0,43.15-27.11,71.64-70,71.64C830.51,242.1,804.23,212.78,804.23,170.46Zm100.41,0c0-26-9.68-37.62-29.59-37.62s-29.6,11.62-29.6,37.62,9.68,38.17,29.6,38.17S904.64,196.46,904.64,170.46Z" transform="translate(-40.3 -52.62)"></path>
-                <path class="cls-1" d="M1036.58,238.51V154.14c0-17.15-6.36-22.68-20.74-22.68-15.77,0-23.79,8-23.79,24.89v82.16H951.94V102.41h38.17v17.15c7.75-13.83,21-20.74,40.94-20.74,26.56,0,45.92,16.87,45.92,43.42v96.27Z" transform="translate(-40.3 -52.62)"></path>
-                </svg>
-                <span class="fs-4">Python Package Index</span>
-            </a>
-            </header>
-            <div class="btn-group" role="group" aria-label="navigation">
-              <a type="button" class="btn btn-sm btn-outline-primary" href="/">Home</a>
-              <a type="button" class="btn btn-sm btn-outline-primary" href="/packages">Packages</a>
-              <a type="button" class="btn btn-sm btn-outline-primary" href="/simple">Simple Index</a>
-            </div>
-            <h3 class="mt-3">Index of packages</h3>
-            % for file, href in links:
-                 <a href="{{href}}">{{file}}</a><br>
-            % end
-            </div>
-            </div>
-        </body>
-    </html>
-    """
-    return template(tmpl, links=links)
+    return _LINKS_TMPL.render(
+        title="Index of packages",
+        static_root=request.custom_script_root + "static/",
+        links=links,
+    )
 
 
 @app.route("/packages/:filename#.*#")
 @auth("download")
 def server_static(filename):
-    entries = config.backend.get_all_packages()
-    for x in entries:
-        f = x.relfn_unix
-        if f == filename:
-            response = static_file(
-                filename,
-                root=x.root,
-                mimetype=mimetypes.guess_type(filename)[0],
-            )
-            if config.cache_control:
-                response.set_header(
-                    "Cache-Control", f"public, max-age={config.cache_control}"
-                )
-            return response
-
-    return HTTPError(404, f"Not Found ({filename} does not exist)\n\n")
+    pkg = config.backend.find_package(filename)
+    if pkg is None:
+        return HTTPError(404, f"Not Found ({filename} does not exist)\n\n")
+
+    # static_file() returns the open file as the body, which bottle hands to
+    # the server's `wsgi.file_wrapper`, so servers supporting it may use
+    # sendfile. Wrapping or reading it here would defeat that.
+    response = static_file(
+        filename,
+        root=pkg.root,
+        mimetype=mimetypes.guess_type(filename)[0],
+    )
+    if config.cache_control:
+        response.set_header(
+            "Cache-Control", f"public, max-age={config.cache_control}"
+        )
+    return response
 
 
 @app.route("/:project/json")
@@ -459,22 +581,24 @@ def json_info(project):
     if project != normalized:
         return redirect(f"/{normalized}/json", 301)
 
-    packages = sorted(
-        config.backend.find_project_packages(project),
-        key=lambda x: x.parsed_version,
-        reverse=True,
+    packages = _cached_listing(
+        ("json_info", project),
+        lambda: sorted(
+            config.backend.find_project_packages(project),
+            key=lambda x: x.parsed_version,
+            reverse=True,
+        ),
     )
 
     if not packages:
         raise HTTPError(404, f"package {project} not found")
 
+    _check_etag()
     latest_version = packages[0].version
     releases = {}
-    req_url = request.url
+    pkg_prefix = urljoin(request.url, "../../packages/")
     for x in packages:
-        releases[x.version] = [
-            {"url": urljoin(req_url, "../../packages/" + x.relfn)}
-        ]
+        releases[x.version] = [{"url": pkg_prefix + x.relfn}]
     rv = {"info": {"version": latest_version}, "releases": releases}
     response.content_type = "application/json"
     return dumps(rv)
@@ -0,0 +1,53 @@
+"""ASGI entrypoint for running pypiserver under an ASGI server like uvicorn.
+
+The ASGI wrapper is only available when the `asgiref` package is installed,
+e.g. with ``pip install pypiserver[asgi]``.
+"""
+
+import typing as t
+
+try:
+    from asgiref.sync import sync_to_async
+    from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+
+    ENABLE_ASGI = True
+
+except ImportError:
+
+    ENABLE_ASGI = False
+
+import pypiserver
+
+if ENABLE_ASGI:
+
+    class _WsgiToAsgiInstance(WsgiToAsgiInstance):
+        # asgiref runs the WSGI app as "thread sensitive" code, that is all
+        # requests on one single thread. Run each of them on the thread pool
+        # of the event loop instead, so that a slow request or client does
+        # not hold up all the others.
+        run_wsgi_app = sync_to_async(
+            WsgiToAsgiInstance.__dict__["run_wsgi_app"].func,
+            thread_sensitive=False,
+        )
+
+    class _WsgiToAsgi(WsgiToAsgi):
+        async def __call__(self, scope, receive, send):
+            args = [self.wsgi_application]
+            # Older asgiref versions have no `duplicate_header_limit`
+            if hasattr(self, "duplicate_header_limit"):
+                args.append(self.duplicate_header_limit)
+            await _WsgiToAsgiInstance(*args)(scope, receive, send)
+
+
+def asgi_app(**kwargs: t.Any) -> t.Any:
+    """Construct an ASGI app running pypiserver.
+
+    Takes the same keyword arguments as :func:`pypiserver.app`. Each request
+    runs the WSGI app on a thread of the event loop's default executor.
+    """
+    if not ENABLE_ASGI:
+        raise RuntimeError(
+            "Please install the extra asgi requirements by running 'pip "
+            "install pypiserver[asgi]' to use the ASGI app"
+        )
+    return _WsgiToAsgi(pypiserver.app(**kwargs))
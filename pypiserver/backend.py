@@ -1,9 +1,11 @@
 import abc
 import functools
 import hashlib
+import io
 import itertools
 import logging
 import os
+import shutil
 import typing as t
 from pathlib import Path
 
@@ -42,6 +44,10 @@ class IBackend(abc.ABC):
     def get_projects(self) -> t.Iterable[str]:
         pass
 
+    @abc.abstractmethod
+    def find_package(self, relfn: str) -> t.Optional[PkgFile]:
+        pass
+
     @abc.abstractmethod
     def exists(self, filename: str) -> bool:
         pass
@@ -62,6 +68,10 @@ class IBackend(abc.ABC):
     def remove_package(self, pkg: PkgFile) -> None:
         pass
 
+    @abc.abstractmethod
+    def catalog_version(self) -> t.Optional[int]:
+        pass
+
 
 class Backend(IBackend, abc.ABC):
     def __init__(self, config: "Configuration"):
@@ -137,6 +147,26 @@ class Backend(IBackend, abc.ABC):
             self.get_all_packages(),
         )
 
+    def find_package(self, relfn: str) -> t.Optional[PkgFile]:
+        """Return the package whose `relfn_unix` path equals `relfn`, or
+        None. When implementing a Backend class, either use this method as
+        is, or override it with a more performant version.
+        """
+        return next(
+            (pkg for pkg in self.get_all_packages() if pkg.relfn_unix == relfn),
+            None,
+        )
+
+    def catalog_version(self) -> t.Optional[int]:
+        """Return a stamp that changes whenever the available packages change,
+        so that callers may reuse anything derived from an earlier listing
+        while the stamp stays the same. Return None if the Backend cannot
+        tell, which means nothing may be reused. When implementing a Backend
+        class, either use this method as is, or override it if changes can
+        be tracked.
+        """
+        return None
+
 
 class SimpleFileBackend(Backend):
     def __init__(self, config: "Configuration"):
@@ -189,9 +219,20 @@ class CachingFileBackend(SimpleFileBackend):
 
     def get_all_packages(self) -> t.Iterable[PkgFile]:
         return itertools.chain.from_iterable(
-            self.cache_manager.listdir(r, listdir) for r in self.roots
+            self.cache_manager.listdir(r, sorted_listdir) for r in self.roots
         )
 
+    def find_package(self, relfn: str) -> t.Optional[PkgFile]:
+        for root in self.roots:
+            index = self.cache_manager.relfn_index(root, sorted_listdir)
+            pkg = index.get(relfn)
+            if pkg is not None:
+                return pkg
+        return None
+
+    def catalog_version(self) -> t.Optional[int]:
+        return self.cache_manager.generation
+
     def digest(self, pkg: PkgFile) -> t.Optional[str]:
         if self.hash_algo is None or pkg.fn is None:
             return None
@@ -202,24 +243,61 @@ class CachingFileBackend(SimpleFileBackend):
 
 def write_file(fh: t.BinaryIO, destination: PathLike) -> None:
     """write a byte stream into a destination file. Writes are chunked to reduce
-    the memory footprint
+    the memory footprint, or done within the kernel if possible
     """
     chunk_size = 2**20  # 1 MB
     offset = fh.tell()
     try:
         with open(destination, "wb") as dest:
-            for chunk in iter(lambda: fh.read(chunk_size), b""):
-                dest.write(chunk)
+            if not _copy_file_range(fh, dest, offset):
+                shutil.copyfileobj(fh, dest, chunk_size)
     finally:
         fh.seek(offset)
 
 
+def _copy_file_range(src: t.BinaryIO, dest: t.BinaryIO, offset: int) -> bool:
+    """Copy `src` from `offset` onwards into the empty `dest` without passing
+    the data through user space. Return False if this is not possible, in
+    which case `dest` is left empty.
+    """
+    copy_file_range = getattr(os, "copy_file_range", None)  # Linux, py3.8+
+    if copy_file_range is None or not isinstance(
+        src, (io.BufferedReader, io.BufferedRandom, io.FileIO)
+    ):
+        return False
+    try:
+        while True:
+            copied = copy_file_range(src.fileno(), dest.fileno(), 2**30, offset)
+            if not copied:
+                return True
+            offset += copied
+    except OSError:
+        # e.g. not supported by the filesystem or the kernel
+        dest.seek(0)
+        dest.truncate()
+        return False
+
+
 def listdir(root: Path) -> t.Iterator[PkgFile]:
     root = root.resolve()
     files = all_listed_files(root)
     yield from valid_packages(root, files)
 
 
+def sorted_listdir(root: Path) -> t.List[PkgFile]:
+    """Like `listdir()`, but ordered by directory, name and version, so that
+    re-sorting a cached listing (or a project's part of it) is a linear pass.
+    """
+    return sorted(
+        listdir(root),
+        key=lambda pkg: (
+            os.path.dirname(pkg.relfn),  # type: ignore
+            pkg.pkgname,
+            pkg.parsed_version,
+        ),
+    )
+
+
 def all_listed_files(root: Path) -> t.Iterator[Path]:
     for dirpath, dirnames, filenames in os.walk(root):
         dirnames[:] = (
@@ -307,6 +385,12 @@ class BackendProxy(IBackend):
     def get_projects(self) -> t.Iterable[str]:
         return self.backend.get_projects()
 
+    def find_package(self, relfn: str) -> t.Optional[PkgFile]:
+        pkg = self.backend.find_package(relfn)
+        if pkg is not None:
+            pkg.digester = self.backend.digest
+        return pkg
+
     def exists(self, filename: str) -> bool:
         assert "/" not in filename
         return self.backend.exists(filename)
@@ -321,5 +405,8 @@ class BackendProxy(IBackend):
     def remove_package(self, pkg: PkgFile) -> None:
         return self.backend.remove_package(pkg)
 
+    def catalog_version(self) -> t.Optional[int]:
+        return self.backend.catalog_version()
+
     def digest(self, pkg: PkgFile) -> t.Optional[str]:
         return self.backend.digest(pkg)
@@ -34,6 +34,13 @@ class CacheManager:
     then we could do more granular invalidation. In practice, this
     is good enough for now.
 
+    The relfn_index_cache maps each root to a dict of its listdir
+    output keyed by `relfn_unix`, so single packages can be looked up
+    without a scan. It is invalidated together with the listdir_cache.
+
+    The generation counter is bumped on every listdir invalidation, so that
+    callers can tell whether anything derived from a listing is stale.
+
     The digest_cache exists on a per-file basis, because computing
     hashes on large files can get expensive, and it's very easy to
     invalidate specific filenames.
@@ -49,6 +56,12 @@ class CacheManager:
         # Cache for listdir output
         self.listdir_cache = {}
 
+        # Cache for listdir output, keyed by relative unix path
+        self.relfn_index_cache = {}
+
+        # Bumped whenever a listdir cache entry is invalidated
+        self.generation = 0
+
         # Cache for hashes: two-level dictionary
         # -> key: hash_algo, value: dict
         #    -> key: file path, value: hash
@@ -84,6 +97,28 @@ class CacheManager:
                 self.listdir_cache[root] = v
                 return v
 
+    def relfn_index(
+        self,
+        root: t.Union[Path, str],
+        impl_fn: t.Callable[[Path], t.Iterable["PkgFile"]],
+    ) -> t.Dict[str, "PkgFile"]:
+        root = str(root)
+        with self.listdir_lock:
+            try:
+                return self.relfn_index_cache[root]
+            except KeyError:
+                pass
+
+        pkgs = self.listdir(root, impl_fn)
+        v = {}
+        for pkg in pkgs:
+            v.setdefault(pkg.relfn_unix, pkg)
+        with self.listdir_lock:
+            # only store the index if the listing was not invalidated meanwhile
+            if self.listdir_cache.get(root) is pkgs:
+                self.relfn_index_cache[root] = v
+        return v
+
     def digest_file(
         self, fpath: str, hash_algo: str, impl_fn: t.Callable[[str, str], str]
     ) -> str:
@@ -115,6 +150,8 @@ class CacheManager:
     def invalidate_root_cache(self, root: t.Union[Path, str]):
         with self.listdir_lock:
             self.listdir_cache.pop(str(root), None)
+            self.relfn_index_cache.pop(str(root), None)
+            self.generation += 1
 
 
 class _EventHandler:
@@ -130,6 +167,10 @@ class _EventHandler:
         if event.is_directory:
             return
 
+        # Nor about files merely being read, e.g. when computing digests
+        if event.event_type in ("opened", "closed_no_write"):
+            return
+
         # Lazy: just invalidate the whole cache
         cache.invalidate_root_cache(self.root)
 
@@ -42,6 +42,7 @@ import pathlib
 import re
 import sys
 import textwrap
+import threading
 import typing as t
 from distutils.util import strtobool as strtoint
 
@@ -743,11 +744,40 @@ class RunConfig(_ConfigCommon):
 
         loaded_pw_file = HtpasswdFile(self.password_file)
 
+        # Password hashes are deliberately slow to check, so remember the
+        # credentials that passed, until the password file changes. Only a
+        # digest of the passwords is kept.
+        passed: t.Dict[t.Tuple[str, bytes], None] = {}
+        max_passed = 256
+        generation = 0
+        lock = threading.Lock()
+
         # Construct a local closure over the loaded PW file and return as our
         # authentication function.
         def auther(uname: str, pw: str) -> bool:
-            loaded_pw_file.load_if_changed()
-            return loaded_pw_file.check_password(uname, pw)
+            nonlocal generation
+            key = (
+                uname,
+                hashlib.sha256(pw.encode("utf-8", "surrogatepass")).digest(),
+            )
+            with lock:
+                if loaded_pw_file.load_if_changed():
+                    passed.clear()
+                    generation += 1
+                if key in passed:
+                    return True
+                checked_generation = generation
+
+            if not loaded_pw_file.check_password(uname, pw):
+                return False
+            with lock:
+                # don't remember a check made against an outdated file
+                if generation == checked_generation:
+                    if len(passed) >= max_passed:
+                        # dicts keep insertion order: drop the oldest entry
+                        del passed[next(iter(passed))]
+                    passed[key] = None
+            return True
 
         return auther
 
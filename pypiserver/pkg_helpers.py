@@ -1,3 +1,4 @@
+import functools
 import os
 import re
 import typing as t
@@ -10,6 +11,8 @@ def normalize_pkgname(name: str) -> str:
     return re.sub(r"[-_.]+", "-", name).lower()
 
 
+# clients keep asking for the same few projects, so skip re-normalizing them
+@functools.lru_cache(maxsize=1024)
 def normalize_pkgname_for_url(name: str) -> str:
     """Perform PEP 503 normalization and ensure the value is safe for URLs."""
     return quote(normalize_pkgname(name))
@@ -36,6 +39,7 @@ def _parse_version_parts(s):
     yield "*final"  # ensure that alpha/beta/candidate are before final
 
 
+@functools.lru_cache(maxsize=4096)
 def parse_version(s: str) -> tuple:
     parts = []
     for part in _parse_version_parts(s.lower()):
@@ -43,10 +43,15 @@ setup(
     long_description=read_file("README.rst"),
     version=get_version(),
     packages=["pypiserver"],
-    package_data={"pypiserver": ["welcome.html"]},
+    package_data={"pypiserver": ["welcome.html", "static/*.svg"]},
     python_requires=">=3.6",
     setup_requires=setup_requires,
-    extras_require={"passlib": ["passlib>=1.6"], "cache": ["watchdog"]},
+    extras_require={
+        "passlib": ["passlib>=1.6"],
+        "cache": ["watchdog"],
+        "asgi": ["asgiref>=3.3", "uvicorn[standard]"],
+        "orjson": ["orjson"],
+    },
     tests_require=tests_require,
     url="https://github.com/pypiserver/pypiserver",
     maintainer=(
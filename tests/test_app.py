@@ -1,10 +1,12 @@
 #! /usr/bin/env py.test
 
 # Builtin imports
+import io
 import logging
 import os
 import pathlib
 import xmlrpc.client as xmlrpclib
+import zipfile
 from html import unescape
 
 # Third party imports
@@ -41,6 +43,34 @@ def testapp(app):
     return webtest.TestApp(app)
 
 
+@pytest.fixture
+def cached_testapp(tmpdir):
+    """Return a webtest TestApp of a pypiserver app with a cached-dir backend"""
+    from pypiserver import app
+
+    return webtest.TestApp(
+        app(
+            roots=[pathlib.Path(tmpdir.strpath)],
+            authenticate=[],
+            password_file=".",
+            backend_arg="cached-dir",
+        )
+    )
+
+
+def app_globals(testapp):
+    """Return the globals of the `_app` module behind a webtest TestApp
+
+    Each app gets its own `_app` module (see `pypiserver.app_from_config`),
+    and all of its route callbacks are defined in it.
+    """
+    for route in testapp.app.routes:
+        module_globals = route.callback.__globals__
+        if module_globals.get("app") is testapp.app:
+            return module_globals
+    raise LookupError("no route of the app is defined in its _app module")
+
+
 @pytest.fixture
 def root(tmpdir):
     """Return a pytest temporary directory"""
@@ -192,6 +222,97 @@ def test_favicon(testapp):
     testapp.get("/favicon.ico", status=404)
 
 
+def test_logo(testapp):
+    resp = testapp.get("/static/logo.svg")
+    assert resp.content_type == "image/svg+xml"
+    assert "immutable" in resp.headers["Cache-Control"]
+    assert resp.body.startswith(b"<svg")
+    assert "<svg" not in testapp.get("/simple/").text
+
+
+def test_nonroot_logo(testpriv):
+    resp = testpriv.get("/priv/simple/")
+    resp.mustcontain('<img src="/priv/static/logo.svg"')
+    assert testpriv.get("/priv/static/logo.svg").body.startswith(b"<svg")
+
+
+def test_nonroot_logo_with_x_forwarded_host(testapp):
+    resp = testapp.get(
+        "/packages/", headers={"X-Forwarded-Host": "forward.ed/priv/"}
+    )
+    resp.mustcontain('<img src="/priv/static/logo.svg"')
+
+
+def test_listings_cached_until_catalog_changes(root, cached_testapp):
+    root.join("bar-1.0.tar.gz").write("")
+    backend = cached_testapp.app._pypiserver_config.backend
+    cached_testapp.get("/simple/")
+    calls = []
+    real_get_projects = backend.get_projects
+    backend.get_projects = lambda: calls.append(1) or real_get_projects()
+    cached_testapp.get("/simple/")
+    assert not calls
+
+    cached_testapp.post(
+        "/",
+        params={":action": "file_upload"},
+        upload_files=[("content", "foo-1.0.tar.gz", b"")],
+    )
+    resp = cached_testapp.get("/simple/")
+    assert calls
+    resp.mustcontain("foo")
+
+
+def test_listing_cache_is_bounded(root, cached_testapp):
+    root.join("foo-1.0.tar.gz").write("")
+    _app = app_globals(cached_testapp)
+    _app["_LISTING_CACHE_SIZE"] = 2
+    for i in range(5):
+        cached_testapp.get(f"/simple/nope{i}/", status=302)
+        cached_testapp.get(f"/nope{i}/json", status=404)
+    assert not _app["_listing_cache"]
+
+    cached_testapp.get("/simple/foo/")
+    cached_testapp.get("/foo/json")
+    cached_testapp.get("/simple/")
+    assert list(_app["_listing_cache"]) == [
+        ("json_info", "foo"),
+        ("simpleindex",),
+    ]
+
+
+@pytest.mark.parametrize(
+    "path", ["/simple/", "/simple/foo/", "/packages/", "/foo/json"]
+)
+def test_index_etag(root, cached_testapp, path):
+    root.join("foo-1.0.tar.gz").write("")
+    etag = cached_testapp.get(path).headers["ETag"]
+    cached_testapp.get(path, headers={"If-None-Match": etag}, status=304)
+
+    cached_testapp.post(
+        "/",
+        params={":action": "file_upload"},
+        upload_files=[("content", "foo-2.0.tar.gz", b"")],
+    )
+    resp = cached_testapp.get(path, headers={"If-None-Match": etag}, status=200)
+    assert resp.headers["ETag"] != etag
+
+
+@pytest.mark.parametrize(
+    "path, status", [("/simple/nope/", 302), ("/nope/json", 404)]
+)
+def test_no_etag_for_missing_project(root, cached_testapp, path, status):
+    root.join("foo-1.0.tar.gz").write("")
+    resp = cached_testapp.get(path, status=status)
+    assert "ETag" not in resp.headers
+    cached_testapp.get(path, headers={"If-None-Match": "*"}, status=status)
+
+
+def test_no_etag_without_catalog_version(root, testapp):
+    root.join("foo-1.0.tar.gz").write("")
+    assert "ETag" not in testapp.get("/simple/").headers
+
+
 def test_fallback(testapp):
     assert not testapp.app._pypiserver_config.disable_fallback
     resp = testapp.get("/simple/pypiserver/", status=302)
@@ -431,6 +552,25 @@ def test_json_info(root, testapp):
     assert len(resp.json["releases"]) == 2
 
 
+@pytest.mark.parametrize("module", ["json", "orjson"])
+def test_json_info_encoders(root, testapp, monkeypatch, module):
+    """The JSON API gives the same data with and without orjson."""
+    dumps = pytest.importorskip(module).dumps
+    monkeypatch.setitem(app_globals(testapp), "dumps", dumps)
+    root.join("foobar-1.0.zip").write("")
+    root.join("foobar-1.1.zip").write("")
+
+    resp = testapp.get("/foobar/json")
+    assert resp.content_type == "application/json"
+    assert resp.json == {
+        "info": {"version": "1.1"},
+        "releases": {
+            "1.1": [{"url": "http://localhost:80/packages/foobar-1.1.zip"}],
+            "1.0": [{"url": "http://localhost:80/packages/foobar-1.0.zip"}],
+        },
+    }
+
+
 def test_json_info_package_not_existing(root, testapp):
     resp = testapp.get("/foobar/json", status=404)
 
@@ -470,6 +610,25 @@ def test_cache_control_set(root):
     assert resp.headers["Cache-Control"] == f"public, max-age={AGE}"
 
 
+def test_download_uses_wsgi_file_wrapper(root, testapp):
+    """Downloads are handed to the server's `wsgi.file_wrapper` (which may
+    use sendfile) with an explicit Content-Length."""
+    root.join("foo_bar-1.0.tar.gz").write("content")
+    wrapped = []
+
+    def file_wrapper(filelike, blksize=8192):
+        wrapped.append(filelike)
+        return iter(lambda: filelike.read(blksize), b"")
+
+    resp = testapp.get(
+        "/packages/foo_bar-1.0.tar.gz",
+        extra_environ={"wsgi.file_wrapper": file_wrapper},
+    )
+    assert len(wrapped) == 1
+    assert resp.headers["Content-Length"] == "7"
+    assert resp.body == b"content"
+
+
 def test_upload_noAction(testapp):
     resp = testapp.post("/", expect_errors=1)
     assert resp.status == "400 Bad Request"
@@ -531,6 +690,23 @@ def test_upload_with_signature(package, root, testapp):
     assert f"{package.lower()}.asc" in uploaded_pkgs
 
 
+@pytest.mark.parametrize(
+    "fname, valid",
+    [
+        ("Foo_Bar-1.0.tar.gz", True),
+        ("foo-1.0+local!1.whl", True),
+        ("foo-1.0.tar.gz\n", False),
+        ("foo 1.0.tar.gz", False),
+        ("../foo-1.0.tar.gz", False),
+        ("", False),
+    ],
+)
+def test_is_valid_pkg_filename(fname, valid):
+    from pypiserver import _app
+
+    assert _app.is_valid_pkg_filename(fname) is valid
+
+
 @pytest.mark.parametrize("package", invalid_files)
 def test_upload_badFilename(package, root, testapp):
     resp = testapp.post(
@@ -543,6 +719,43 @@ def test_upload_badFilename(package, root, testapp):
     assert f"Bad filename: {package}" in resp.text
 
 
+def _zip_bytes(*names):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        for name in names:
+            zf.writestr(name, "")
+    return buf.getvalue()
+
+
+def _corrupt_zip_bytes(marker, offset, value):
+    """Return a zip of an index.html, with a bad byte after `marker`."""
+    data = bytearray(_zip_bytes("index.html"))
+    data[data.rfind(marker) + offset] = value
+    return bytes(data)
+
+
+@pytest.mark.parametrize(
+    "content, status",
+    [
+        (_zip_bytes("index.html"), 200),
+        (_zip_bytes("other.html"), 400),
+        (b"not a zip", 400),
+        # central directory size past the file start: ValueError
+        (_corrupt_zip_bytes(b"PK\x05\x06", 14, 0xFF), 400),
+        # unsupported "extract version": NotImplementedError
+        (_corrupt_zip_bytes(b"PK\x01\x02", 6, 0x47), 400),
+    ],
+)
+def test_doc_upload(testapp, content, status):
+    resp = testapp.post(
+        "/",
+        params={":action": "doc_upload"},
+        upload_files=[("content", "docs.zip", content)],
+        expect_errors=True,
+    )
+    assert resp.status_code == status
+
+
 @pytest.mark.parametrize(
     "pkgs,matches",
     [
@@ -603,6 +816,84 @@ def test_search(root, testapp, search_xml, pkgs, matches):
             assert returned["version"] in [match[1] for match in matches]
 
 
+def test_search_missing_method_name(testapp):
+    xml = "<xml><string>test</string></xml>"
+    resp = testapp.post("/RPC2", xml, expect_errors=True)
+    assert resp.status_code == 400
+
+
+def test_search_missing_string(testapp):
+    xml = "<methodCall><methodName>search</methodName></methodCall>"
+    resp = testapp.post("/RPC2", xml, expect_errors=True)
+    assert resp.status_code == 400
+
+
+@pytest.mark.parametrize("query", ["t", "te", "test", "est-t", "xyz", ""])
+def test_search_with_index(tmpdir, query):
+    """Searching through the name index matches the plain scan."""
+    from pypiserver import app
+
+    for pkg in ["test-1.0.tar.gz", "test-test-2.0.tar.gz", "other-2.0.tar.gz"]:
+        tmpdir.join(pkg).write("")
+    kwargs = dict(roots=[tmpdir.strpath], authenticate=[], password_file=".")
+    xml = f"<xml><methodName>search</methodName><string>{query}</string></xml>"
+    results = []
+    for backend in ("simple-dir", "cached-dir"):
+        testapp = webtest.TestApp(app(backend_arg=backend, **kwargs))
+        hits = xmlrpclib.loads(testapp.post("/RPC2", xml).text)[0][0]
+        results.append(sorted((hit["name"], hit["version"]) for hit in hits))
+    assert results[0] == results[1]
+    assert all(query in name for name, _ in results[1])
+
+
+def test_search_response_matches_xmlrpclib():
+    """The streamed search response is what xmlrpclib would produce."""
+    from pypiserver import _app
+
+    pkgs = [
+        core.PkgFile("a&b", "1.0<2", relfn="a&b-1.0<2.tar.gz"),
+        core.PkgFile("test", "1.0", relfn="test-1.0.tar.gz"),
+    ]
+    hits = [(0, pkgs[0]), (3, pkgs[1])]
+    expected = xmlrpclib.dumps(
+        (
+            [
+                {
+                    "_pypi_ordering": ordering,
+                    "version": p.version,
+                    "name": p.pkgname,
+                    "summary": p.version,
+                }
+                for ordering, p in hits
+            ],
+        ),
+        "search",
+        methodresponse=True,
+    )
+    assert "".join(_app._dump_search_hits(hits)) == expected
+
+
+def test_auth_calls_custom_auther_every_time(root):
+    """Custom authers may revoke access at any time, so are not cached."""
+    from pypiserver import app
+
+    calls = []
+
+    def auther(username, password):
+        calls.append(username)
+        return password == "secret"
+
+    testapp = webtest.TestApp(
+        app(roots=[root.strpath], authenticate=["list"], auther=auther)
+    )
+    testapp.authorization = ("Basic", ("user", "secret"))
+    testapp.get("/simple/")
+    testapp.get("/simple/")
+    testapp.authorization = ("Basic", ("other", "wrong"))
+    testapp.get("/simple/", status=403)
+    assert calls == ["user", "user", "other"]
+
+
 class TestRemovePkg:
     """The API allows removal of packages."""
 
@@ -0,0 +1,81 @@
+import asyncio
+import threading
+
+import pytest
+
+pytest.importorskip("asgiref")
+
+import pypiserver  # noqa: E402
+from pypiserver.asgi import asgi_app  # noqa: E402
+
+
+async def get(app, path):
+    """Send a single GET request through an ASGI app."""
+    messages = []
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.sleep(1)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"localhost")],
+        "server": ("localhost", 80),
+        "client": ("127.0.0.1", 12345),
+    }
+    await app(scope, receive, send)
+    status = messages[0]["status"]
+    body = b"".join(m.get("body", b"") for m in messages[1:])
+    return status, body
+
+
+def run(coro):
+    # Not asyncio.run(), which needs python 3.7
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def test_asgi_app(tmp_path):
+    (tmp_path / "foo-1.0.tar.gz").write_bytes(b"")
+    app = asgi_app(roots=[tmp_path], authenticate=[], password_file=".")
+    status, body = run(get(app, "/simple/"))
+    assert status == 200
+    assert b"foo" in body
+
+
+def test_asgi_app_runs_requests_concurrently(monkeypatch):
+    # Both requests must be in the WSGI app at the same time to pass
+    barrier = threading.Barrier(2, timeout=5)
+
+    def wsgi_app(environ, start_response):
+        barrier.wait()
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        return [threading.current_thread().name.encode()]
+
+    monkeypatch.setattr(pypiserver, "app", lambda **kwargs: wsgi_app)
+    app = asgi_app()
+
+    async def get_twice():
+        return await asyncio.gather(get(app, "/a"), get(app, "/b"))
+
+    (status_a, thread_a), (status_b, thread_b) = run(get_twice())
+    assert status_a == status_b == 200
+    assert thread_a != thread_b
@@ -1,8 +1,18 @@
+from io import BytesIO
 from pathlib import Path
+from types import SimpleNamespace
 
 import pytest
 
-from pypiserver.backend import listdir
+from pypiserver.backend import (
+    CachingFileBackend,
+    SimpleFileBackend,
+    listdir,
+    sorted_listdir,
+    write_file,
+)
+from pypiserver.cache import _EventHandler
+from pypiserver.config import Config
 
 
 def create_path(root: Path, path: Path):
@@ -40,3 +50,89 @@ def test_listdir_doesnt_generate_pkgfile_for_invalid_file(tmp_path, path_name):
     path = Path(path_name)
     create_path(tmp_path, path)
     assert not list(listdir(tmp_path))
+
+
+@pytest.mark.parametrize("backend_cls", [SimpleFileBackend, CachingFileBackend])
+def test_find_package(tmp_path, backend_cls):
+    create_path(tmp_path, Path("some/nested/pkg-1.0.zip"))
+    backend = backend_cls(Config.default_with_overrides(roots=[tmp_path]))
+    pkg = backend.find_package("some/nested/pkg-1.0.zip")
+    assert pkg is not None
+    assert pkg.fn == str(tmp_path / "some/nested/pkg-1.0.zip")
+    assert backend.find_package("pkg-1.0.zip") is None
+
+
+def test_caching_find_package_invalidated_on_add(tmp_path):
+    backend = CachingFileBackend(
+        Config.default_with_overrides(roots=[tmp_path])
+    )
+    assert backend.find_package("pkg-1.0.zip") is None
+    backend.add_package("pkg-1.0.zip", BytesIO(b""))
+    assert backend.find_package("pkg-1.0.zip") is not None
+
+
+def test_simple_catalog_version_is_unknown(tmp_path):
+    backend = SimpleFileBackend(Config.default_with_overrides(roots=[tmp_path]))
+    assert backend.catalog_version() is None
+
+
+def test_caching_catalog_version_changes_on_add(tmp_path):
+    backend = CachingFileBackend(
+        Config.default_with_overrides(roots=[tmp_path])
+    )
+    version = backend.catalog_version()
+    assert version is not None
+    backend.add_package("pkg-1.0.zip", BytesIO(b""))
+    assert backend.catalog_version() != version
+
+
+def test_write_file_from_stream(tmp_path):
+    fh = BytesIO(b"skip-content")
+    fh.seek(5)
+    write_file(fh, tmp_path / "out")
+    assert (tmp_path / "out").read_bytes() == b"content"
+    assert fh.tell() == 5
+
+
+def test_write_file_from_file(tmp_path):
+    src = tmp_path / "src"
+    src.write_bytes(b"skip-" + b"x" * 2**20)
+    with open(src, "rb") as fh:
+        fh.read(5)
+        write_file(fh, tmp_path / "out")
+        assert fh.tell() == 5
+    assert (tmp_path / "out").read_bytes() == b"x" * 2**20
+
+
+def test_sorted_listdir(tmp_path):
+    for path in [
+        "b/foo-1.0.zip",
+        "a/foo-1.10.zip",
+        "a/foo-1.9.zip",
+        "bar-2.zip",
+    ]:
+        create_path(tmp_path, Path(path))
+    assert [pkg.relfn_unix for pkg in sorted_listdir(tmp_path)] == [
+        "bar-2.zip",
+        "a/foo-1.9.zip",
+        "a/foo-1.10.zip",
+        "b/foo-1.0.zip",
+    ]
+
+
+@pytest.mark.parametrize(
+    "event_type, invalidated",
+    [("opened", False), ("closed_no_write", False), ("created", True)],
+)
+def test_cache_invalidated_only_on_changes(tmp_path, event_type, invalidated):
+    backend = CachingFileBackend(
+        Config.default_with_overrides(roots=[tmp_path])
+    )
+    version = backend.catalog_version()
+    event = SimpleNamespace(
+        is_directory=False,
+        event_type=event_type,
+        src_path=str(tmp_path / "pkg-1.0.zip"),
+    )
+    _EventHandler(backend.cache_manager, str(tmp_path)).dispatch(event)
+    assert (backend.catalog_version() != version) is invalidated
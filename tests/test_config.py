@@ -3,6 +3,7 @@
 import hashlib
 import typing as t
 import itertools
+import os
 import pathlib
 import sys
 
@@ -756,3 +757,37 @@ def test_argv_conf():
         assert conf.disable_fallback is True
     finally:
         sys.argv = orig_args
+
+
+def test_htpasswd_auther_remembers_passed_checks(tmp_path, monkeypatch):
+    """Passed checks are reused until the password file changes."""
+    from passlib.apache import HtpasswdFile
+
+    path = str(tmp_path / "htpasswd")
+    pw_file = HtpasswdFile(path, new=True)
+    pw_file.set_password("a", "a")
+    pw_file.save()
+    conf = Config.from_args(["run", "-P", path])
+
+    checks = []
+    real_check_password = HtpasswdFile.check_password
+    monkeypatch.setattr(
+        HtpasswdFile,
+        "check_password",
+        lambda self, *args: checks.append(args)
+        or real_check_password(self, *args),
+    )
+    assert conf.auther("a", "a") is True
+    assert conf.auther("a", "a") is True
+    assert len(checks) == 1
+    assert conf.auther("a", "b") is False
+    assert conf.auther("a", "b") is False
+    assert len(checks) == 3
+
+    # A new password takes effect on the very next check
+    pw_file.set_password("a", "new")
+    pw_file.save()
+    mtime = os.path.getmtime(path) + 10
+    os.utime(path, (mtime, mtime))
+    assert conf.auther("a", "a") is False
+    assert conf.auther("a", "new") is True
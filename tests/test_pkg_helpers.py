@@ -3,7 +3,12 @@ from pathlib import WindowsPath, PureWindowsPath
 
 import pytest
 
-from pypiserver.pkg_helpers import guess_pkgname_and_version, is_listed_path
+from pypiserver.pkg_helpers import (
+    guess_pkgname_and_version,
+    is_listed_path,
+    normalize_pkgname_for_url,
+    parse_version,
+)
 
 files = [
     ("pytz-2012b.tar.bz2", "pytz", "2012b"),
@@ -114,3 +119,15 @@ paths = [
 @pytest.mark.parametrize(("pathname", "allowed"), paths)
 def test_allowed_path_check(pathname, allowed):
     assert is_listed_path(pathname) == allowed
+
+
+def test_normalize_pkgname_for_url_is_memoized():
+    assert normalize_pkgname_for_url("Foo.Bar") == "foo-bar"
+    assert normalize_pkgname_for_url("Foo.Bar") is normalize_pkgname_for_url(
+        "Foo.Bar"
+    )
+
+
+def test_parse_version_is_memoized():
+    assert parse_version("1.0rc1") is parse_version("1.0rc1")
+    assert parse_version("1.0rc1") < parse_version("1.0")
@@ -1,32 +1,30 @@
 #! /usr/bin/env py.test
 """
-Checks an actual pypi-server against various clients.
+Checks a pypi-server app against the requests made by various clients.
 
-The tests below are using 3 ways to startup pypi-servers:
+The tests below run the server in-process, driving it through a `webtest`
+client, with 3 kinds of servers:
 
-- "open": a per-module server instance without any authed operations,
-  serving a single `wheel` package, on a fixed port.
-- "open": a per-module server instance with authed 'download/upload'
-  operations, serving a single `wheel` package, on a fixed port.
-- "new_server": starting a new server with any configurations on each test.
+- "open": a server without any authed operations.
+- "authed": a server with authed 'download/upload' operations.
+- "partial": a server with authed 'upload' operations only.
+
+Each of them serves a fresh, per-test root directory. The requests sent
+mimic those of `pip download`, `setup.py upload` and `twine`.
 
 """
-import contextlib
-import itertools
-import os
-import shutil
-import socket
+import hashlib
+import re
+import subprocess
 import sys
-import time
 import typing as t
-from collections import namedtuple
 from pathlib import Path
-from shlex import split
-from subprocess import Popen
-from urllib.error import URLError
-from urllib.request import urlopen
+from urllib.parse import urldefrag, urljoin
 
 import pytest
+import webtest
+
+import pypiserver
 
 # ######################################################################
 # Fixtures & Helper Functions
@@ -34,73 +32,33 @@ import pytest
 
 
 CURRENT_PATH = Path(__file__).parent
-ports = itertools.count(10000)
-Srv = namedtuple("Srv", ("port", "root"))
-
-
-@contextlib.contextmanager
-def run_server(root, authed=False, other_cli=""):
-    """Run a server, optionally with partial auth enabled."""
-    htpasswd = (
-        CURRENT_PATH.joinpath("../fixtures/htpasswd.a.a").expanduser().resolve()
-    )
-    pswd_opt_choices = {
-        True: f"-P {htpasswd} -a update,download",
-        False: "-P. -a.",
-        "partial": f"-P {htpasswd} -a update",
+HTPASSWD = CURRENT_PATH.joinpath("../fixtures/htpasswd.a.a").resolve()
+CREDENTIALS = ("a", "a")
+
+
+def make_client(root: Path, authed=False, **kwargs) -> webtest.TestApp:
+    """Build a server app, optionally with partial auth enabled."""
+    auth_choices = {
+        True: dict(
+            password_file=str(HTPASSWD), authenticate=["update", "download"]
+        ),
+        False: dict(password_file=".", authenticate=[]),
+        "partial": dict(password_file=str(HTPASSWD), authenticate=["update"]),
     }
-    pswd_opts = pswd_opt_choices[authed]
-
-    port = next(ports)
-    cmd = (
-        f"{sys.executable} -m pypiserver.__main__ "
-        f"run -vvv --overwrite -i 127.0.0.1 "
-        f"-p {port} {pswd_opts} {other_cli} {root}"
+    app = pypiserver.app(
+        roots=[root],
+        overwrite=True,
+        **auth_choices[authed],
+        **kwargs,
     )
-    proc = Popen(cmd.split(), bufsize=2**16)
-    srv = Srv(port, root)
-    try:
-        wait_until_ready(srv)
-        assert proc.poll() is None
-        yield srv
-    finally:
-        print(f"Killing {srv}")
-        _kill_proc(proc)
-
-
-def wait_until_ready(srv: Srv, n_tries=10):
-    for _ in range(n_tries):
-        if is_ready(srv):
-            return True
-        time.sleep(0.5)
-    raise TimeoutError
-
-
-def is_ready(srv: Srv):
-    try:
-        return urlopen(build_url(srv.port), timeout=0.5).getcode() in (
-            200,
-            401,
-        )
-    except (URLError, socket.timeout):
-        return False
-
-
-def _kill_proc(proc):
-    proc.terminate()
-    try:
-        proc.wait(timeout=1)
-    finally:
-        proc.kill()
-
-
-def build_url(port: t.Union[int, str], user: str = "", pswd: str = "") -> str:
-    auth = f"{user}:{pswd}@" if user or pswd else ""
-    return f"http://{auth}localhost:{port}"
+    return webtest.TestApp(app)
 
 
 def run_setup_py(path: Path, arguments: str):
-    return os.system(f"{sys.executable} {path / 'setup.py'} {arguments}")
+    # Run from the project, so that build/ and *.egg-info/ land there too
+    return subprocess.run(
+        [sys.executable, "setup.py", *arguments.split()], cwd=path
+    ).returncode
 
 
 # A test-distribution to check if
@@ -131,94 +89,53 @@ def project(tmp_path_factory):
     return projdir
 
 
-@pytest.fixture(scope="session")
-def server_root(tmp_path_factory):
-    return tmp_path_factory.mktemp("root")
-
-
 @pytest.fixture(scope="module")
-def wheel_file(project, tmp_path_factory):
-    distdir = tmp_path_factory.mktemp("dist")
-    assert run_setup_py(project, f"bdist_wheel -d {distdir}") == 0
-    return list(distdir.glob("centodeps*.whl"))[0]
+def build_dist(project, tmp_path_factory):
+    """Return a function building (once) a distribution of `project`."""
+    dists = {}
 
+    def build(pkg_frmt: str) -> Path:
+        if pkg_frmt not in dists:
+            distdir = tmp_path_factory.mktemp("dist")
+            assert run_setup_py(project, f"{pkg_frmt} -d {distdir}") == 0
+            dists[pkg_frmt] = next(distdir.glob("centodeps*"))
+        return dists[pkg_frmt]
 
-@pytest.fixture()
-def hosted_wheel_file(wheel_file, server_root):
-    dst = server_root / wheel_file.name
-    shutil.copy(wheel_file, dst)
-    yield dst
-    if dst.is_file():
-        dst.unlink()
-
-
-def clear_directory(root: Path):
-    for path in root.iterdir():
-        if path.is_file():
-            path.unlink()
+    return build
 
 
 @pytest.fixture(scope="module")
-def _open_server(server_root):
-    with run_server(server_root, authed=False) as srv:
-        yield srv
+def wheel_file(build_dist):
+    return build_dist("bdist_wheel")
 
 
-@pytest.fixture
-def open_server(_open_server: Srv):
-    yield _open_server
-    clear_directory(_open_server.root)
+@pytest.fixture()
+def server_root(tmp_path):
+    root = tmp_path / "root"
+    root.mkdir()
+    return root
 
 
-@pytest.fixture(scope="module")
-def _authed_server(server_root):
-    with run_server(server_root, authed=True) as srv:
-        yield srv
+@pytest.fixture()
+def hosted_wheel_file(wheel_file, server_root):
+    dst = server_root / wheel_file.name
+    dst.write_bytes(wheel_file.read_bytes())
+    return dst
 
 
 @pytest.fixture
-def authed_server(_authed_server):
-    yield _authed_server
-    clear_directory(_authed_server.root)
-
-
-@pytest.fixture(scope="module")
-def _partial_auth_server(server_root):
-    with run_server(server_root, authed="partial") as srv:
-        yield srv
+def open_server(server_root):
+    return make_client(server_root, authed=False)
 
 
 @pytest.fixture
-def partial_authed_server(_partial_auth_server):
-    yield _partial_auth_server
-    clear_directory(_partial_auth_server.root)
+def authed_server(server_root):
+    return make_client(server_root, authed=True)
 
 
 @pytest.fixture
-def empty_packdir(tmp_path_factory):
-    return tmp_path_factory.mktemp("dists")
-
-
-def pip_download(
-    cmd: str,
-    port: t.Union[int, str],
-    install_dir: str,
-    user: str = None,
-    pswd: str = None,
-) -> int:
-    url = build_url(port, user, pswd)
-    return _run_pip(f"-vv download -d {install_dir} -i {url} {cmd}")
-
-
-def _run_pip(cmd: str) -> int:
-    ncmd = (
-        "pip --no-cache-dir --disable-pip-version-check "
-        f"--retries 0 --timeout 5 --no-input {cmd}"
-    )
-    print(f"PIP: {ncmd}")
-    proc = Popen(split(ncmd))
-    proc.communicate()
-    return proc.returncode
+def partial_authed_server(server_root):
+    return make_client(server_root, authed="partial")
 
 
 @pytest.fixture
@@ -226,57 +143,52 @@ def pipdir(tmp_path_factory):
     return tmp_path_factory.mktemp("pip")
 
 
-@contextlib.contextmanager
-def pypirc_file(repo, username="''", password="''"):
-    pypirc_path = Path.home() / ".pypirc"
-    old_pypirc = pypirc_path.read_text() if pypirc_path.is_file() else None
-    pypirc_path.write_text(
-        "\n".join(
-            (
-                "[distutils]",
-                "index-servers: test",
-                "",
-                "[test]",
-                f"repository: {repo}",
-                f"username: {username}",
-                f"password: {password}",
-            )
-        )
-    )
-    try:
-        yield pypirc_path
-    finally:
-        if old_pypirc:
-            pypirc_path.write_text(old_pypirc)
-        else:
-            pypirc_path.unlink()
-
-
-@pytest.fixture
-def open_pypirc(open_server):
-    with pypirc_file(repo=build_url(open_server.port)) as path:
-        yield path
-
-
-@pytest.fixture
-def authed_pypirc(authed_server):
-    username, password = "a", "a"
-    with pypirc_file(
-        repo=build_url(authed_server.port),
-        username=username,
-        password=password,
-    ) as path:
-        yield path
-
-
-def run_twine(command: str, package: str, conf: str) -> None:
-    proc = Popen(
-        split(
-            f"twine {command} --repository test --config-file {conf} {package}"
-        )
+def pip_download(
+    client: webtest.TestApp,
+    project: str,
+    download_dir: Path,
+    auth: t.Optional[t.Tuple[str, str]] = None,
+) -> int:
+    """Fetch the files of `project` like `pip download` would.
+
+    Return 0 on success, and the failing HTTP status code otherwise.
+    """
+    client.authorization = ("Basic", auth) if auth else None
+    resp = client.get(f"/simple/{project}/", expect_errors=True)
+    if resp.status_int != 200:
+        return resp.status_int
+    # Only package links carry a digest, pages also link to /, /packages...
+    for href in re.findall(r'href="([^"#]+#[^"]+)"', resp.text):
+        url, fragment = urldefrag(urljoin(resp.request.url, href))
+        resp = client.get(url, expect_errors=True)
+        if resp.status_int != 200:
+            return resp.status_int
+        algo, _, digest = fragment.partition("=")
+        assert hashlib.new(algo, resp.body).hexdigest() == digest
+        download_dir.joinpath(url.rsplit("/", 1)[-1]).write_bytes(resp.body)
+    return 0
+
+
+def upload(
+    client: webtest.TestApp,
+    dist: Path,
+    auth: t.Optional[t.Tuple[str, str]] = None,
+    action: str = "file_upload",
+):
+    """POST `dist` like `setup.py upload` and `twine` do."""
+    client.authorization = ("Basic", auth) if auth else None
+    params = [
+        (":action", action),
+        ("name", "centodeps"),
+        ("version", "0.0.0"),
+        # The many requirements of centodeps make for a large form body
+        *(("requires_dist", "a==1.0") for _ in range(200)),
+    ]
+    return client.post(
+        "/",
+        params=params,
+        upload_files=[("content", dist.name, dist.read_bytes())],
     )
-    proc.communicate()
-    assert not proc.returncode, f"Twine {command} failed. See stdout/err"
 
 
 # ######################################################################
@@ -284,81 +196,99 @@ def run_twine(command: str, package: str, conf: str) -> None:
 # ######################################################################
 
 all_servers = [
-    ("open_server", "open_pypirc"),
-    ("authed_server", "authed_pypirc"),
-    ("partial_authed_server", "authed_pypirc"),
+    ("open_server", None),
+    ("authed_server", CREDENTIALS),
+    ("partial_authed_server", CREDENTIALS),
 ]
 
 
 def test_pip_install_package_not_found(open_server, pipdir):
-    assert pip_download("centodeps", open_server.port, pipdir) != 0
+    assert pip_download(open_server, "centodeps", pipdir) != 0
+    assert not list(pipdir.iterdir())
+    # Unknown packages are redirected to the fallback index
+    resp = open_server.get("/simple/centodeps/", status=302)
+    assert resp.location == "https://pypi.org/simple/centodeps/"
+
+
+def test_pip_install_package_not_found_no_fallback(server_root, pipdir):
+    client = make_client(server_root, disable_fallback=True)
+    assert pip_download(client, "centodeps", pipdir) == 404
     assert not list(pipdir.iterdir())
 
 
 def test_pip_install_open_succeeds(open_server, hosted_wheel_file, pipdir):
-    assert pip_download("centodeps", open_server.port, pipdir) == 0
+    assert pip_download(open_server, "centodeps", pipdir) == 0
     assert pipdir.joinpath(hosted_wheel_file.name).is_file()
 
 
-@pytest.mark.usefixtures("wheel_file")
+@pytest.mark.usefixtures("hosted_wheel_file")
 def test_pip_install_authed_fails(authed_server, pipdir):
-    assert pip_download("centodeps", authed_server.port, pipdir) != 0
+    assert pip_download(authed_server, "centodeps", pipdir) == 401
     assert not list(pipdir.iterdir())
 
 
 def test_pip_install_authed_succeeds(authed_server, hosted_wheel_file, pipdir):
     assert (
-        pip_download(
-            "centodeps", authed_server.port, pipdir, user="a", pswd="a"
-        )
-        == 0
+        pip_download(authed_server, "centodeps", pipdir, auth=CREDENTIALS) == 0
     )
     assert pipdir.joinpath(hosted_wheel_file.name).is_file()
 
 
 @pytest.mark.parametrize("pkg_frmt", ["bdist", "bdist_wheel"])
-@pytest.mark.parametrize(["server_fixture", "pypirc_fixture"], all_servers)
+@pytest.mark.parametrize(["server_fixture", "auth"], all_servers)
 def test_setuptools_upload(
-    server_fixture, pypirc_fixture, project, pkg_frmt, server_root, request
+    server_fixture, auth, build_dist, pkg_frmt, server_root, request
 ):
-    request.getfixturevalue(server_fixture)
-    request.getfixturevalue(pypirc_fixture)
+    client = request.getfixturevalue(server_fixture)
+    dist = build_dist(pkg_frmt)
 
     assert len(list(server_root.iterdir())) == 0
 
     for i in range(5):
         print(f"++Attempt #{i}")
-        assert run_setup_py(project, f"-vvv {pkg_frmt} upload -r test") == 0
+        upload(client, dist, auth=auth)
     assert len(list(server_root.iterdir())) == 1
 
 
-def test_partial_authed_open_download(partial_authed_server):
-    """Validate that partial auth still allows downloads."""
-    url = build_url(partial_authed_server.port) + "/simple"
-    resp = urlopen(url)
-    assert resp.getcode() == 200
+@pytest.mark.parametrize(
+    "server_fixture", ["authed_server", "partial_authed_server"]
+)
+def test_upload_authed_fails(server_fixture, wheel_file, server_root, request):
+    client = request.getfixturevalue(server_fixture)
+    client.authorization = None
+    client.post(
+        "/",
+        params={":action": "file_upload"},
+        upload_files=[("content", wheel_file.name, wheel_file.read_bytes())],
+        status=401,
+    )
+    assert not list(server_root.iterdir())
 
 
-@pytest.mark.parametrize("hash_algo", ("md5", "sha256", "sha512"))
 @pytest.mark.usefixtures("hosted_wheel_file")
-def test_hash_algos(server_root, pipdir, hash_algo):
-    """Test twine upload with no authentication"""
-    with run_server(
-        server_root, other_cli="--hash-algo {}".format(hash_algo)
-    ) as srv:
-        assert pip_download("centodeps", srv.port, pipdir) == 0
+def test_partial_authed_open_download(partial_authed_server, pipdir):
+    """Validate that partial auth still allows downloads."""
+    assert partial_authed_server.get("/simple/").status_int == 200
+    assert pip_download(partial_authed_server, "centodeps", pipdir) == 0
 
 
-@pytest.mark.parametrize(["server_fixture", "pypirc_fixture"], all_servers)
-def test_twine_upload(
-    server_fixture, pypirc_fixture, server_root, wheel_file, request
-):
-    """Test twine upload with no authentication"""
+@pytest.mark.parametrize("hash_algo", ("md5", "sha256", "sha512"))
+def test_hash_algos(server_root, hosted_wheel_file, pipdir, hash_algo):
+    """Test that links carry digests of the configured hash algorithm"""
+    client = make_client(server_root, hash_algo=hash_algo)
+    resp = client.get("/simple/centodeps/")
+    digest = hashlib.new(hash_algo, hosted_wheel_file.read_bytes())
+    assert f"#{hash_algo}={digest.hexdigest()}" in resp.text
+    assert pip_download(client, "centodeps", pipdir) == 0
+
+
+@pytest.mark.parametrize(["server_fixture", "auth"], all_servers)
+def test_twine_upload(server_fixture, auth, server_root, wheel_file, request):
+    """Test twine-style uploads"""
     assert len(list(server_root.iterdir())) == 0
-    request.getfixturevalue(server_fixture)
-    pypirc = request.getfixturevalue(pypirc_fixture)
+    client = request.getfixturevalue(server_fixture)
 
-    run_twine("upload", wheel_file, conf=pypirc)
+    upload(client, wheel_file, auth=auth)
 
     assert len(list(server_root.iterdir())) == 1
     assert server_root.joinpath(wheel_file.name).is_file(), (
@@ -367,9 +297,9 @@ def test_twine_upload(
     )
 
 
-@pytest.mark.parametrize(["server_fixture", "pypirc_fixture"], all_servers)
-def test_twine_register(server_fixture, pypirc_fixture, wheel_file, request):
-    """Test unauthenticated twine registration"""
-    request.getfixturevalue(server_fixture)
-    pypirc = request.getfixturevalue(pypirc_fixture)
-    run_twine("register", wheel_file, conf=pypirc)
+@pytest.mark.parametrize(["server_fixture", "auth"], all_servers)
+def test_twine_register(server_fixture, auth, server_root, wheel_file, request):
+    """Test twine-style registration, which is accepted and ignored"""
+    client = request.getfixturevalue(server_fixture)
+    upload(client, wheel_file, auth=auth, action="submit")
+    assert not list(server_root.iterdir())